@@ -1,24 +1,30 @@
 #!/usr/bin/env python3
 """
 Get and match uploaded datasets from LaminDB with registry datasets.
+
+requests/bs4 and lamindb are imported only by the stages that use them, so
+runs that skip or reuse those stages do not pay for the imports.
 """
 
+import io
+import os
 import re
+import json
 import time
+import hashlib
 import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
 import pandas as pd
 import numpy as np
-import requests
-from bs4 import BeautifulSoup
-from typing import Optional, Tuple
-
-try:
-    import lamindb as ln
-    LAMINDB_AVAILABLE = True
-except ImportError:
-    LAMINDB_AVAILABLE = False
-    print("Warning: lamindb not available. LaminDB integration will be skipped.")
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
+# Default paths are relative to this script, so it also runs from the repo root (`sdb merge`)
+METADATA_DIR = Path(__file__).resolve().parent / "metadata"
+VISIUM_METADATA = str(METADATA_DIR / "visium_20250606.csv")
+XENIUM_METADATA = str(METADATA_DIR / "xenium_20250606.csv")
+CACHE_DIR = str(METADATA_DIR.parent / ".pipeline_cache")
 TIMEOUT = 20
 SLEEP_BETWEEN = 0.8
 SOFTWARE_PATTERNS = [
@@ -27,10 +33,14 @@ SOFTWARE_PATTERNS = [
     (re.compile(r"\bXenium\s*Onboard\s*Analysis\s*v(?:ersion\s*)?(\d+\.\d+\.\d+)\b", re.I), "Xenium Onboard Analysis"),
     (re.compile(r"on[- ]instrument analysis .*Xenium\s*Onboard\s*Analysis\s*v(\d+\.\d+\.\d+)", re.I), "Xenium Onboard Analysis"),
 ]
+# Columns of the uploaded-datasets frame that merge_datasets relies on
+UPLOADED_COLUMNS = ["Dataset Url", "Replicate", "Software", "local_uid", "lamin_link", "created_at", "description"]
 
 
 def fetch_html(url: str) -> Optional[str]:
     """Fetch HTML content from URL with error handling."""
+    import requests
+
     try:
         r = requests.get(url, timeout=TIMEOUT, headers={"User-Agent": "Mozilla/5.0"})
         if r.status_code == 200:
@@ -45,6 +55,8 @@ def extract_software_version(html: str) -> Tuple[Optional[str], Optional[str]]:
     if not html:
         return (None, None)
     
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     texts = " ".join(s.get_text(separator=" ", strip=True) for s in soup.find_all())
     corpus = texts + " " + html
@@ -94,22 +106,25 @@ def get_uploaded_datasets(save_intermediate: bool = False) -> pd.DataFrame:
     """Fetch uploaded datasets from LaminDB and merge with metadata."""
     print("Fetching uploaded datasets from LaminDB...")
     
-    if not LAMINDB_AVAILABLE:
+    try:
+        import lamindb as ln
+    except ImportError:
         print("Warning: LaminDB not available. Using empty dataset.")
-        return pd.DataFrame()
+        return pd.DataFrame(columns=UPLOADED_COLUMNS)
     
     artifacts = ln.Artifact.df(limit=None, features=True, include=['description', 'created_at'])
     artifacts = artifacts[artifacts['key'].astype(str).str.startswith("10")]
     artifacts['key'] = artifacts['key'].apply(lambda x: x.split(".")[0])
     dataset_status = artifacts[['uid', 'key', 'created_at', 'description']].rename(columns={'uid': 'lamin_link', 'key': 'local_uid'})
     dataset_status.columns = dataset_status.columns.map(lambda x: x.replace(' ', '_')).str.lower()
+    dataset_status['created_at'] = dataset_status['created_at'].astype(str)
     
     try:
-        visium = pd.read_csv("metadata/visium_20250606.csv", sep=';')
-        xenium = pd.read_csv("metadata/xenium_20250606.csv", sep=';')
+        visium = pd.read_csv(VISIUM_METADATA, sep=';', dtype=str)
+        xenium = pd.read_csv(XENIUM_METADATA, sep=';', dtype=str)
     except FileNotFoundError as e:
         print(f"Error loading metadata files: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(columns=UPLOADED_COLUMNS)
     
     result = pd.concat([visium, xenium], axis=0, ignore_index=True)
     result = result.merge(dataset_status, left_on='uid', right_on='local_uid', how='left')
@@ -163,19 +178,331 @@ def merge_datasets(registry_df: pd.DataFrame, uploaded_df: pd.DataFrame, save_in
     return merged_datasets
 
 
+def _as_csv_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Round-trip a frame through CSV so it compares equal to one read back from disk."""
+    return _read_csv_frame(io.StringIO(df.to_csv(index=False)))
+
+
+def _read_csv_frame(source) -> pd.DataFrame:
+    """read_csv with dtype=str that returns an empty frame for a file without columns."""
+    try:
+        return pd.read_csv(source, dtype=str)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+
+def _content_hash(records: List[dict]) -> str:
+    """Stable hash of a list of row dicts (NaN/None treated alike)."""
+    clean = [{k: (None if pd.isna(v) else str(v)) for k, v in r.items()} for r in records]
+    return hashlib.sha1(json.dumps(clean, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _status_counts(df: pd.DataFrame) -> Dict[str, int]:
+    return {k: int(v) for k, v in df["status"].value_counts().items()}
+
+
+def merge_incremental(registry_df: pd.DataFrame, uploaded_df: pd.DataFrame, output_path: str,
+                      provenance_path: str, full: bool = False) -> Tuple[pd.DataFrame, dict, int]:
+    """Merge like merge_datasets, recomputing only registry rows whose inputs changed.
+
+    Every registry row is keyed by its dataset_id and identified by a content hash
+    of the row itself and of the uploaded rows its primary_source matches. The
+    provenance file records these hashes together with the number and status of
+    the output rows each registry row produced. Rows whose hashes are unchanged
+    are copied from the previous output; the rest go through merge_datasets.
+    Output order always follows the registry order. The provenance also stores a
+    hash of the output file it describes; if the file on disk no longer matches
+    (edited by hand, or written without its provenance), every row is recomputed.
+    With full=True the previous output is ignored and every row is recomputed.
+
+    Nothing is written here: once the output CSV has been saved, pass the
+    returned provenance to write_provenance.
+
+    Returns (merged frame, new provenance, number of registry rows recomputed).
+    """
+    provenance, previous = {"rows": {}, "order": [], "counts": {}}, None
+    if not full:
+        try:
+            with open(provenance_path, encoding="utf-8") as f:
+                provenance = json.load(f)
+            previous = pd.read_csv(output_path, dtype=str)
+        except (FileNotFoundError, ValueError):
+            provenance, previous = {"rows": {}, "order": [], "counts": {}}, None
+    if previous is not None and provenance.get("output") != _file_digest(output_path):
+        print("Warning: previous output does not match its provenance, recomputing all rows.")
+        provenance, previous = {"rows": {}, "order": [], "counts": {}}, None
+
+    # Slice of the previous output belonging to each registry row
+    prev_slices: Dict[str, pd.DataFrame] = {}
+    offset = 0
+    for key in provenance["order"]:
+        n = provenance["rows"][key]["n"]
+        if previous is not None:
+            prev_slices[key] = previous.iloc[offset:offset + n]
+        offset += n
+
+    uploaded_groups: Dict[str, List[dict]] = {}
+    if "Dataset Url" in uploaded_df.columns:
+        for url, group in uploaded_df.groupby("Dataset Url", sort=False):
+            uploaded_groups[url] = group.to_dict("records")
+
+    keys: List[str] = []
+    hashes: Dict[str, Tuple[str, str]] = {}
+    seen: Dict[str, int] = {}
+    recompute: List[int] = []
+    for pos, row in enumerate(registry_df.to_dict("records")):
+        dsid = "" if pd.isna(row.get("dataset_id")) else str(row.get("dataset_id"))
+        seen[dsid] = seen.get(dsid, 0) + 1
+        key = dsid if seen[dsid] == 1 else f"{dsid}#{seen[dsid]}"
+        keys.append(key)
+        src = row.get("primary_source")
+        hashes[key] = (_content_hash([row]), _content_hash(uploaded_groups.get(src, []) if not pd.isna(src) else []))
+        old = provenance["rows"].get(key)
+        if old is None or key not in prev_slices or (old["registry"], old["uploaded"]) != hashes[key]:
+            recompute.append(pos)
+
+    fresh: Dict[str, pd.DataFrame] = {}
+    if recompute:
+        subset = registry_df.iloc[recompute].assign(_row=recompute)
+        urls = set(subset["primary_source"].dropna())
+        uploaded_subset = uploaded_df[uploaded_df["Dataset Url"].isin(urls)] if "Dataset Url" in uploaded_df.columns else uploaded_df
+        merged = merge_datasets(subset, uploaded_subset)
+        merged = _as_csv_frame(merged)
+        for pos, group in merged.groupby("_row", sort=False):
+            fresh[keys[int(pos)]] = group.drop(columns="_row")
+
+    # Summary counts: start from the previous run and apply only the changed rows
+    counts = dict(provenance["counts"])
+    recomputed = set(recompute)
+    new_rows: Dict[str, dict] = {}
+    parts: List[pd.DataFrame] = []
+    for pos, key in enumerate(keys):
+        old = provenance["rows"].get(key)
+        if pos not in recomputed:
+            part = prev_slices[key]
+            new_rows[key] = old
+        else:
+            part = fresh.get(key)
+            if old is not None:
+                for status, n in old["status"].items():
+                    counts[status] = counts.get(status, 0) - n
+            status = _status_counts(part) if part is not None else {}
+            for status_name, n in status.items():
+                counts[status_name] = counts.get(status_name, 0) + n
+            new_rows[key] = {"registry": hashes[key][0], "uploaded": hashes[key][1],
+                             "n": 0 if part is None else len(part), "status": status}
+        if part is not None and len(part):
+            parts.append(part)
+    for key in set(provenance["rows"]) - set(keys):
+        for status, n in provenance["rows"][key]["status"].items():
+            counts[status] = counts.get(status, 0) - n
+
+    final_df = pd.concat(parts, ignore_index=True) if parts else _as_csv_frame(merge_datasets(registry_df.iloc[:0], uploaded_df))
+    counts = {k: v for k, v in counts.items() if v}
+
+    return final_df, {"order": keys, "rows": new_rows, "counts": counts}, len(recompute)
+
+
+def write_provenance(provenance_path: str, provenance: dict, output_path: str) -> None:
+    """Write the provenance of a merge together with the hash of its saved output."""
+    with open(provenance_path, "w", encoding="utf-8") as f:
+        json.dump({**provenance, "output": _file_digest(output_path)}, f, indent=1)
+        f.write("\n")
+
+
+@dataclass
+class Stage:
+    """One step of the pipeline.
+
+    A stage is cached by a hash of its name, its parameters, the content of the
+    files it reads, and the content of its dependencies' outputs. Volatile stages
+    read state that is not part of that hash (LaminDB, the previous merge output)
+    and always run unless their last output is explicitly reused.
+    """
+    name: str
+    func: Callable[..., pd.DataFrame]
+    deps: List[str] = field(default_factory=list)
+    params: Dict[str, object] = field(default_factory=dict)
+    files: List[str] = field(default_factory=list)
+    volatile: bool = False
+
+
+def _file_digest(path) -> str:
+    try:
+        return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return "missing"
+
+
+def stage_key(stage: Stage, dep_digests: Dict[str, str]) -> str:
+    payload = {
+        "name": stage.name,
+        "params": stage.params,
+        "files": {f: _file_digest(f) for f in stage.files},
+        "deps": [dep_digests[d] for d in stage.deps],
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _artifact_path(cache_dir: str, stage: str, key: str) -> Path:
+    return Path(cache_dir) / stage / f"{key}.csv"
+
+
+def stage_lineages(stages: List[Stage]) -> Dict[str, str]:
+    """Hash of what each stage reads (file paths, not content) through its dependencies.
+
+    Outputs of the same stage with the same lineage are interchangeable for
+    reuse: the last scrape of one --input is never reused for another.
+    """
+    by_name = {st.name: st for st in stages}
+    lineages: Dict[str, str] = {}
+
+    def visit(name: str) -> str:
+        if name not in lineages:
+            st = by_name[name]
+            payload = {"name": name, "files": [os.path.abspath(f) for f in st.files],
+                       "deps": [visit(d) for d in st.deps]}
+            lineages[name] = hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return lineages[name]
+
+    for st in stages:
+        visit(st.name)
+    return lineages
+
+
+def _latest_pointer(cache_dir: str, stage: str, lineage: str) -> Path:
+    return Path(cache_dir) / stage / f"latest-{lineage}"
+
+
+def _latest_artifact(cache_dir: str, stage: str, lineage: str) -> Optional[Path]:
+    latest = _latest_pointer(cache_dir, stage, lineage)
+    if not latest.exists():
+        return None
+    path = latest.parent / latest.read_text(encoding="utf-8").strip()
+    return path if path.exists() else None
+
+
+def _resolve(stage: Stage, cache_dir: str, dep_digests: Dict[str, str], refresh: Set[str],
+             reuse: Dict[str, Optional[str]], lineage: str) -> Tuple[str, Optional[Path]]:
+    """Return (action, artifact path) for a stage whose dependencies are known."""
+    if stage.name in reuse:
+        if reuse[stage.name]:
+            return "reuse-file", Path(reuse[stage.name])
+        return "reuse-latest", _latest_artifact(cache_dir, stage.name, lineage)
+    path = _artifact_path(cache_dir, stage.name, stage_key(stage, dep_digests))
+    if stage.volatile or stage.name in refresh or not path.exists():
+        return "run", path
+    return "cached", path
+
+
+def plan_pipeline(stages: List[Stage], cache_dir: str, refresh: Set[str],
+                  reuse: Dict[str, Optional[str]]) -> List[Tuple[str, str]]:
+    """Dry run: what each stage would do, without running anything.
+
+    `stages` must be in dependency order. A stage downstream of one that runs
+    can only be decided once that output exists, unless it is reused, volatile
+    or refreshed.
+    """
+    digests: Dict[str, str] = {}
+    lineages = stage_lineages(stages)
+    plan: List[Tuple[str, str]] = []
+    for st in stages:
+        waiting = [d for d in st.deps if d not in digests]
+        if waiting and st.name not in reuse:
+            if st.volatile or st.name in refresh:
+                plan.append((st.name, f"run ({'volatile' if st.volatile else 'refresh'})"))
+            else:
+                plan.append((st.name, f"run unless {', '.join(waiting)} output is unchanged"))
+            continue
+        action, path = _resolve(st, cache_dir, digests, refresh, reuse, lineages[st.name])
+        if action == "reuse-latest" and path is None:
+            plan.append((st.name, "reuse-latest (no cached output for this input!)"))
+            continue
+        if action == "reuse-file" and not path.exists():
+            plan.append((st.name, f"reuse-file ({path} does not exist!)"))
+            continue
+        plan.append((st.name, f"{action} ({path})"))
+        if action != "run":
+            digests[st.name] = _file_digest(path)
+    return plan
+
+
+def run_pipeline(stages: List[Stage], cache_dir: str, refresh: Set[str], reuse: Dict[str, Optional[str]],
+                 workers: int = 4) -> Dict[str, pd.DataFrame]:
+    """Run stages as a DAG, starting each as soon as its dependencies are done.
+
+    Independent stages run concurrently on a thread pool. Every stage output is
+    stored under cache_dir/<stage>/<key>.csv; a stage whose key already has an
+    artifact is loaded from it instead of running. Stages in `reuse` load the
+    CSV given for them or, if none was given, the most recent artifact of that
+    stage for the same inputs (see stage_lineages) regardless of its key.
+    """
+    results: Dict[str, pd.DataFrame] = {}
+    digests: Dict[str, str] = {}
+    lineages = stage_lineages(stages)
+
+    def execute(st: Stage) -> Tuple[pd.DataFrame, str]:
+        lineage = lineages[st.name]
+        action, path = _resolve(st, cache_dir, digests, refresh, reuse, lineage)
+        if action == "reuse-latest":
+            if path is None:
+                raise FileNotFoundError(
+                    f"No cached output of stage '{st.name}' for these inputs in {cache_dir}; "
+                    f"run it once or pass a CSV to --skip-{st.name}")
+            print(f"[{st.name}] reusing last cached output {path}")
+        elif action == "reuse-file":
+            if not path.exists():
+                raise FileNotFoundError(f"Output given for stage '{st.name}' does not exist: {path}")
+            print(f"[{st.name}] reusing {path}")
+        elif action == "cached":
+            print(f"[{st.name}] inputs unchanged, loading {path}")
+        else:
+            print(f"[{st.name}] running...")
+            df = _as_csv_frame(st.func(*[results[d] for d in st.deps]))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(path, index=False)
+        if action in ("run", "cached"):
+            _latest_pointer(cache_dir, st.name, lineage).write_text(path.name + "\n", encoding="utf-8")
+        return _read_csv_frame(path), _file_digest(path)
+
+    pending: Dict[object, str] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while len(results) < len(stages):
+            for st in stages:
+                if st.name in results or st.name in pending.values():
+                    continue
+                if all(d in results for d in st.deps):
+                    pending[pool.submit(execute, st)] = st.name
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = pending.pop(fut)
+                results[name], digests[name] = fut.result()
+    return results
+
+
 def main():
     """Main function to orchestrate the entire process."""
     parser = argparse.ArgumentParser(description="Create merged datasets CSV")
-    parser.add_argument("--input", default="./metadata/scraped_datasets.csv", 
+    parser.add_argument("--input", default=str(METADATA_DIR / "scraped_datasets.csv"),
                        help="Input datasets CSV file")
-    parser.add_argument("--output", default="./metadata/datasets_merged.csv", 
+    parser.add_argument("--output", default=str(METADATA_DIR / "datasets_merged.csv"),
                        help="Output merged datasets CSV file")
     parser.add_argument("--save-intermediate", action="store_true", 
                        help="Save intermediate CSV files")
-    parser.add_argument("--skip-software", action="store_true", 
-                       help="Skip adding software version information")
-    parser.add_argument("--skip-lamin", action="store_true", 
-                       help="Skip fetching uploaded datasets from LaminDB")
+    parser.add_argument("--skip-software", nargs="?", const=True, default=False, metavar="CSV",
+                       help="Skip scraping software versions; reuse the given CSV or the last cached result")
+    parser.add_argument("--skip-lamin", nargs="?", const=True, default=False, metavar="CSV",
+                       help="Skip fetching uploaded datasets from LaminDB; reuse the given CSV or the last cached result")
+    parser.add_argument("--refresh", action="append", default=[], choices=["load", "software", "lamin", "merge"],
+                       help="Rerun this stage even if its inputs did not change (repeatable)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                       help="Directory for cached stage outputs")
+    parser.add_argument("--plan", action="store_true",
+                       help="Show which stages would run or be served from cache, then exit")
+    parser.add_argument("--full", action="store_true",
+                       help="Recompute every output row instead of only rows whose inputs changed")
+    parser.add_argument("--check-parity", action="store_true",
+                       help="Also run a full recompute and fail if it differs from the incremental result")
     
     args = parser.parse_args()
     
@@ -186,38 +513,76 @@ def main():
     print(f"Skip software versions: {args.skip_software}")
     print(f"Skip LaminDB: {args.skip_lamin}")
     
-    print("\n1. Loading base dataset...")
-    try:
-        registry_df = pd.read_csv(args.input)
-        print(f"Loaded {len(registry_df)} datasets from {args.input}")
-    except FileNotFoundError:
+    if not Path(args.input).exists():
         print(f"Error: Could not find input file {args.input}")
         return 1
     
-    if not args.skip_software:
-        print("\n2. Adding software version information...")
-        registry_df = add_software_versions(registry_df, args.save_intermediate)
-    else:
-        print("\n2. Skipping software version information...")
-        registry_df = pd.read_csv('./datasets_with_software.csv')
+    provenance_path = args.output + ".provenance.json"
+    merge_provenance: dict = {}
     
-    if not args.skip_lamin:
-        print("\n3. Fetching uploaded datasets from LaminDB...")
-        uploaded_df = get_uploaded_datasets(args.save_intermediate)
-    else:
-        print("\n3. Skipping LaminDB fetch...")
-        uploaded_df = pd.read_csv('./uploaded_datasets.csv')
+    def load() -> pd.DataFrame:
+        df = pd.read_csv(args.input, dtype=str)
+        print(f"Loaded {len(df)} datasets from {args.input}")
+        return df
+    
+    def merge(registry_df: pd.DataFrame, uploaded_df: pd.DataFrame) -> pd.DataFrame:
+        df, provenance, n_recomputed = merge_incremental(registry_df, uploaded_df, args.output,
+                                                         provenance_path, full=args.full)
+        print(f"Recomputed {n_recomputed}/{len(registry_df)} registry rows")
+        merge_provenance.update(provenance)
+        return df
+    
+    stages = [
+        Stage("load", load, files=[args.input]),
+        Stage("software", lambda df: add_software_versions(df, args.save_intermediate), deps=["load"],
+              params={"patterns": [(p.pattern, n) for p, n in SOFTWARE_PATTERNS]}),
+        Stage("lamin", lambda: get_uploaded_datasets(args.save_intermediate),
+              files=[VISIUM_METADATA, XENIUM_METADATA], volatile=True),
+        # merge also reads the previous output and its provenance, so it always runs
+        Stage("merge", merge, deps=["software", "lamin"], volatile=True),
+    ]
+    names = [st.name for st in stages]
+    refresh = set(args.refresh)
+    if args.full:
+        refresh.add("merge")
+    reuse = {name: (None if skip is True else skip)
+             for name, skip in (("software", args.skip_software), ("lamin", args.skip_lamin)) if skip}
+    
+    if args.plan:
+        print("\nPlan:")
+        for name, action in plan_pipeline(stages, args.cache_dir, refresh, reuse):
+            print(f"- {name:<9} {action}")
+        return 0
+    
+    print(f"\nRunning stages {' -> '.join(names)} (cache: {args.cache_dir})...")
+    try:
+        results = run_pipeline(stages, args.cache_dir, refresh, reuse)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return 1
+    final_df = results["merge"]
+    counts = merge_provenance.get("counts") or _status_counts(final_df)
+    
+    if args.save_intermediate:
+        final_df.to_csv("datasets_merged.csv", index=False)
+        print(f"Saved intermediate file: datasets_merged.csv")
     
-    print("\n4. Merging datasets...")
-    final_df = merge_datasets(registry_df, uploaded_df, args.save_intermediate)
+    if args.check_parity:
+        full_df = _as_csv_frame(merge_datasets(results["software"], results["lamin"]))
+        if not full_df.equals(final_df):
+            print("Error: incremental result differs from full recompute")
+            return 1
+        print("Parity check passed: incremental result matches full recompute")
     
-    print(f"\n5. Saving final result to {args.output}...")
+    print(f"\nSaving final result to {args.output}...")
     final_df.to_csv(args.output, index=False)
+    if merge_provenance:
+        write_provenance(provenance_path, merge_provenance, args.output)
     
     print(f"\nSummary:")
     print(f"- Total datasets: {len(final_df)}")
-    print(f"- Uploaded: {len(final_df[final_df['status'] == 'uploaded'])}")
-    print(f"- Todo: {len(final_df[final_df['status'] == 'todo'])}")
+    print(f"- Uploaded: {counts.get('uploaded', 0)}")
+    print(f"- Todo: {counts.get('todo', 0)}")
     
     return 0
 
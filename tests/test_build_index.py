@@ -0,0 +1,27 @@
+"""Payload and search index for the registry page."""
+from __future__ import annotations
+
+import build_index
+
+ROWS = [
+    {"name": "Human pancreas", "short_description": "FFPE section", "tags": "xenium, human",
+     "manufacturer": "10x Genomics", "product": "Xenium", "primary_source": "https://example.org/a",
+     "local_uid": "10u63", "lamin_link": "L0000000000010000", "Replicate": "2",
+     "software_name": "Xenium Onboard Analysis", "software_version": "1.9.0"},
+    {"name": "Mouse brain", "tags": "visium", "manufacturer": "10x Genomics", "product": "Visium"},
+]
+
+
+def test_index_and_fallback_share_fields():
+    payload = build_index.build_payload(ROWS)
+    index = build_index.build_search_index(ROWS)
+    assert payload["search_fields"] == index["fields"] == list(build_index.SEARCH_FIELDS)
+    assert set(build_index.SEARCH_FIELDS) <= set(payload["columns"])
+
+
+def test_identifier_fields_are_indexed():
+    index = build_index.build_search_index(ROWS)
+    postings = dict(zip(index["vocab"], index["postings"]))
+    for token in ("10u63", "l0000000000010000", "ffpe", "onboard", "9", "example"):
+        assert postings[token] == [0], token
+    assert postings["genomics"] == [0, 1]
@@ -0,0 +1,136 @@
+"""crawl_vendors against a local synthetic vendor site.
+
+The site serves a sitemap index and paginated listings that both link
+SDB_CRAWL_PAGES detail pages (default 1,500), with ETags and 304 responses.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import crawl_vendors
+from canon import canonical_source, fingerprint
+
+N_PAGES = int(os.environ.get("SDB_CRAWL_PAGES", "1500"))
+PER_PAGE = 100
+PER_SITEMAP = 500
+KNOWN = 10  # detail pages already in the registry
+
+
+class Site(BaseHTTPRequestHandler):
+    changed: set[int] = set()
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def page(self, path: str) -> tuple[str, str] | None:
+        base = f"http://{self.headers['Host']}"
+        if path == "/sitemap.xml":
+            locs = "".join(f"<sitemap><loc>{base}/sitemap-{i}.xml</loc></sitemap>"
+                           for i in range(-(-N_PAGES // PER_SITEMAP)))
+            return f'<?xml version="1.0"?><sitemapindex xmlns="{crawl_vendors.SITEMAP_NS[1:-1]}">{locs}</sitemapindex>', "application/xml"
+        if m := re.fullmatch(r"/sitemap-(\d+)\.xml", path):
+            i = int(m[1])
+            locs = "".join(f"<url><loc>{base}/datasets/ds-{j}</loc></url>"
+                           for j in range(i * PER_SITEMAP, min(N_PAGES, (i + 1) * PER_SITEMAP)))
+            return f'<?xml version="1.0"?><urlset xmlns="{crawl_vendors.SITEMAP_NS[1:-1]}">{locs}</urlset>', "application/xml"
+        if m := re.fullmatch(r"/list/(\d+)", path):
+            i = int(m[1])
+            links = "".join(f'<a href="/datasets/ds-{j}?utm_source=list">d</a>'
+                            for j in range(i * PER_PAGE, min(N_PAGES, (i + 1) * PER_PAGE)))
+            nxt = f'<a rel="next" href="/list/{i + 1}">next</a>' if (i + 1) * PER_PAGE < N_PAGES else ""
+            return f"<html><body>{links}{nxt}<a href='/about'>about</a></body></html>", "text/html"
+        if m := re.fullmatch(r"/datasets/ds-(\d+)", path):
+            j = int(m[1])
+            version = "v2" if j in self.changed else "v1"
+            return (f'<html><head><title>Dataset {j}</title><meta name="description" content="desc {j} {version}">'
+                    "</head><body></body></html>", "text/html")
+        return None
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0]
+        if path == "/garbage":
+            self.wfile.write(b"garbage\r\n")
+            self.close_connection = True
+            return
+        found = self.page(path)
+        if found is None:
+            self.send_error(404)
+            return
+        body = found[0].encode("utf-8")
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", found[1])
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Site)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def vendor(host: str) -> crawl_vendors.Vendor:
+    return crawl_vendors.Vendor(
+        "Synthetic",
+        [f"http://{host}/sitemap.xml", f"http://{host}/list/0"],
+        re.compile(rf"^https://{re.escape(host)}/datasets/[^/?#]+$"),
+    )
+
+
+def stats(capsys) -> tuple[int, int]:
+    m = re.search(r"Fetched (\d+) pages \((\d+) not modified\)", capsys.readouterr().out)
+    return int(m[1]), int(m[2])
+
+
+def test_incremental_crawl(site, capsys):
+    known = {fingerprint(canonical_source(f"http://{site}/datasets/ds-{j}")) for j in range(KNOWN)}
+    state: dict[str, dict] = {}
+
+    rows = crawl_vendors.crawl([vendor(site)], known, state, workers=16, delay=0)
+    assert len(rows) == N_PAGES - KNOWN
+    assert {r["notes"] for r in rows} == {"new"}
+    assert len({r["primary_source"] for r in rows}) == len(rows)
+    fetched, not_modified = stats(capsys)
+    assert not_modified == 0
+
+    rows = crawl_vendors.crawl([vendor(site)], known, state, workers=16, delay=0)
+    assert rows == []
+    assert stats(capsys) == (fetched, fetched)
+
+    Site.changed = {100, 200, 300}
+    try:
+        rows = crawl_vendors.crawl([vendor(site)], known, state, workers=16, delay=0)
+    finally:
+        Site.changed = set()
+    assert [(r["primary_source"], r["notes"]) for r in rows] == [
+        (f"https://{site}/datasets/ds-{j}", "changed") for j in (100, 200, 300)
+    ]
+    assert stats(capsys) == (fetched, fetched - 3)
+
+
+@pytest.mark.parametrize("path", ["/garbage", "/missing"])
+def test_fetch_errors_are_reported_not_raised(site, path):
+    f = crawl_vendors.fetch(f"http://{site}{path}", {}, crawl_vendors.HostLimiter(0))
+    assert f.status == 0
+
+
+def test_fetch_unreachable_host():
+    f = crawl_vendors.fetch("http://127.0.0.1:9/", {}, crawl_vendors.HostLimiter(0))
+    assert f.status == 0
@@ -0,0 +1,54 @@
+"""Incremental merge of create_merged_datasets against a full recompute."""
+from __future__ import annotations
+
+import pandas as pd
+
+import create_merged_datasets as cmd
+
+UPLOADED_COLUMNS = ["Dataset Url", "local_uid", "lamin_link", "created_at", "description", "Replicate", "Software"]
+
+
+def registry(n: int, renamed: dict[int, str] | None = None) -> pd.DataFrame:
+    renamed = renamed or {}
+    return pd.DataFrame({
+        "dataset_id": [f"ds_{i}" for i in range(n)],
+        "name": [renamed.get(i, f"dataset {i}") for i in range(n)],
+        "primary_source": [f"https://example.org/d/{i}" for i in range(n)],
+        "status": ["todo"] * n,
+    }).astype(str)
+
+
+def uploaded(urls: list[int]) -> pd.DataFrame:
+    rows = [[f"https://example.org/d/{i}", f"10u{i:02d}", f"L{i:012d}0000", "2025-06-06", "", "1", "xenium"]
+            for i in urls]
+    return pd.DataFrame(rows, columns=UPLOADED_COLUMNS).astype(str)
+
+
+def run(tmp_path, reg: pd.DataFrame, up: pd.DataFrame, full: bool = False) -> tuple[pd.DataFrame, dict, int]:
+    out, prov = str(tmp_path / "merged.csv"), str(tmp_path / "merged.csv.provenance.json")
+    df, provenance, n = cmd.merge_incremental(reg, up, out, prov, full=full)
+    df.to_csv(out, index=False)
+    cmd.write_provenance(prov, provenance, out)
+    expected = cmd._as_csv_frame(cmd.merge_datasets(reg, up))
+    pd.testing.assert_frame_equal(df, expected)
+    assert provenance["counts"] == cmd._status_counts(expected)
+    return df, provenance, n
+
+
+def test_only_changed_rows_are_recomputed(tmp_path):
+    run(tmp_path, registry(50), uploaded([1, 2, 3]))
+    _, _, n = run(tmp_path, registry(50), uploaded([1, 2, 3]))
+    assert n == 0
+    _, provenance, n = run(tmp_path, registry(50, {7: "renamed"}), uploaded([1, 2, 3, 9]))
+    assert n == 2
+    assert provenance["counts"] == {"uploaded": 4, "todo": 46}
+    _, _, n = run(tmp_path, registry(48, {7: "renamed"}), uploaded([1, 2, 3, 9]))
+    assert n == 0
+
+
+def test_edited_output_forces_full_recompute(tmp_path):
+    run(tmp_path, registry(20), uploaded([1]))
+    merged = tmp_path / "merged.csv"
+    merged.write_text(merged.read_text().replace("dataset 5", "hand edit"))
+    _, _, n = run(tmp_path, registry(20), uploaded([1]))
+    assert n == 20
@@ -0,0 +1,98 @@
+"""create_merged_datasets.py as a stage DAG: caching, reuse and repeated runs."""
+from __future__ import annotations
+
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+import create_merged_datasets as cmd
+
+UPLOADED = pd.DataFrame(
+    [["https://example.org/a", "1", "xenium", "10u01", "L0000000000010000", "2025-06-06", ""]],
+    columns=cmd.UPLOADED_COLUMNS,
+)
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    calls = {"software": 0}
+
+    def software(df, save_intermediate=False):
+        calls["software"] += 1
+        return df.assign(software_name="Xenium Onboard Analysis", software_version="1.9.0")
+
+    monkeypatch.setattr(cmd, "add_software_versions", software)
+    monkeypatch.setattr(cmd, "get_uploaded_datasets", lambda save_intermediate=False: UPLOADED.copy())
+    monkeypatch.chdir(tmp_path)
+
+    def run(rows: list[tuple[str, str, str]], *flags: str, input_name: str = "in.csv") -> pd.DataFrame:
+        pd.DataFrame(rows, columns=["dataset_id", "name", "primary_source"]).assign(status="todo").to_csv(
+            input_name, index=False)
+        monkeypatch.setattr(sys, "argv", ["create_merged_datasets.py", "--input", input_name,
+                                          "--output", "out.csv", "--cache-dir", "cache", *flags])
+        assert cmd.main() == 0
+        with open("out.csv.provenance.json", encoding="utf-8") as f:
+            assert json.load(f)["output"] == cmd._file_digest("out.csv")
+        return pd.read_csv("out.csv", dtype=str)
+
+    return run, calls
+
+
+def expected(rows: list[tuple[str, str, str]]) -> pd.DataFrame:
+    registry = pd.DataFrame(rows, columns=["dataset_id", "name", "primary_source"]).assign(status="todo")
+    registry = registry.assign(software_name="Xenium Onboard Analysis", software_version="1.9.0")
+    return cmd._as_csv_frame(cmd.merge_datasets(cmd._as_csv_frame(registry), cmd._as_csv_frame(UPLOADED)))
+
+
+def test_repeated_inputs_match_full_merge(pipeline):
+    run, calls = pipeline
+    in1 = [("ds_a", "A", "https://example.org/a"), ("ds_b", "b", "https://example.org/b")]
+    in2 = [("ds_a", "A", "https://example.org/a"), ("ds_b", "B", "https://example.org/b")]
+    in3 = in1 + [("ds_c", "C", "https://example.org/c")]
+    for rows in (in1, in2, in1, in3):
+        pd.testing.assert_frame_equal(run(rows), expected(rows))
+    assert calls["software"] == 3  # in1 is scraped once
+
+
+def test_skip_software_is_scoped_to_the_input(pipeline, tmp_path):
+    run, calls = pipeline
+    rows = [("ds_a", "A", "https://example.org/a")]
+    run(rows, input_name="one.csv")
+    run(rows, "--skip-software", input_name="one.csv")
+    assert calls["software"] == 1
+    with pytest.raises(AssertionError):
+        run(rows, "--skip-software", input_name="two.csv")
+
+    scraped = cmd._as_csv_frame(pd.DataFrame(rows, columns=["dataset_id", "name", "primary_source"]).assign(
+        status="todo", software_name="Space Ranger", software_version="3.0.0"))
+    scraped.to_csv(tmp_path / "scraped.csv", index=False)
+    out = run(rows, "--skip-software", str(tmp_path / "scraped.csv"), input_name="two.csv")
+    assert calls["software"] == 1
+    assert out["software_name"].tolist() == ["Space Ranger"]
+
+
+def test_without_lamindb(pipeline, monkeypatch):
+    run, _ = pipeline
+    monkeypatch.setattr(cmd, "get_uploaded_datasets",
+                        lambda save_intermediate=False: pd.DataFrame(columns=cmd.UPLOADED_COLUMNS))
+    out = run([("ds_a", "A", "https://example.org/a")])
+    assert out["status"].tolist() == ["todo"]
+    assert cmd._as_csv_frame(pd.DataFrame()).empty
+
+
+def test_plan_matches_run(pipeline, capsys):
+    run, _ = pipeline
+    rows = [("ds_a", "A", "https://example.org/a")]
+    run(rows)
+    capsys.readouterr()
+    run(rows, "--plan")
+    plan = capsys.readouterr().out
+    assert "- load      cached" in plan
+    assert "- software  cached" in plan
+    assert "- merge     run (volatile)" in plan
+
+
+def test_default_cache_is_next_to_the_script():
+    assert cmd.CACHE_DIR == str(cmd.METADATA_DIR.parent / ".pipeline_cache")
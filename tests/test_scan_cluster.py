@@ -0,0 +1,99 @@
+"""Incremental rescans of scan_cluster on a synthetic storage tree.
+
+The tree size defaults to 2,000 stores; set SDB_SCAN_STORES=100000 for the
+full-size run.
+"""
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+
+import scan_cluster
+
+N_STORES = int(os.environ.get("SDB_SCAN_STORES", "2000"))
+N_PROJECTS = 50
+
+
+def make_tree(root, n_stores: int) -> int:
+    """Create `n_stores` SpatialData stores under project folders; return the directory count."""
+    for i in range(n_stores):
+        store = root / f"proj{i % N_PROJECTS}" / f"1{i:04x}.zarr"
+        (store / "images" / "img").mkdir(parents=True)
+        (store / "tables" / "table").mkdir(parents=True)
+        (store / ".zattrs").write_text(json.dumps({"spatialdata_attrs": {"version": "0.2"}}))
+    xen = root / "raw" / "106xa__10X__Xenium__Mouse__bone"
+    xen.mkdir(parents=True)
+    (xen / "experiment.xenium").write_text(json.dumps({"analysis_sw_version": "xenium-1.9.0"}))
+    # root + projects + stores + raw + xenium bundle
+    return 1 + min(n_stores, N_PROJECTS) + n_stores + 2
+
+
+@pytest.fixture(scope="module")
+def tree(tmp_path_factory):
+    root = tmp_path_factory.mktemp("cluster")
+    return root, make_tree(root, N_STORES)
+
+
+def test_rescan_is_incremental(tree):
+    root, n_dirs = tree
+    records, cache, rescanned, skipped = scan_cluster.scan([str(root)], {}, workers=8)
+    assert len(records) == N_STORES + 1
+    assert rescanned == n_dirs
+    assert not skipped
+
+    records, cache, rescanned, _ = scan_cluster.scan([str(root)], cache, workers=8)
+    assert rescanned == 0
+    assert len(records) == N_STORES + 1
+
+    touched = root / "proj3" / f"1{3:04x}.zarr"
+    (touched / "images" / "img2").mkdir()
+    records, cache, rescanned, _ = scan_cluster.scan([str(root)], cache, workers=8)
+    assert rescanned == 1
+    rec = next(r for r in records if r.path == str(touched))
+    assert rec.elements == "images/img|images/img2|tables/table"
+    assert rec.n_elements == 3
+
+
+def test_unreadable_directory_is_skipped(tmp_path, monkeypatch):
+    make_tree(tmp_path, 3)
+    blocked = str(tmp_path / "raw")
+    real_scandir = os.scandir
+
+    def scandir(path="."):
+        if os.fspath(path) == blocked:
+            raise PermissionError(13, "Permission denied", path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(scan_cluster.os, "scandir", scandir)
+    records, cache, _, skipped = scan_cluster.scan([str(tmp_path)], {}, workers=4)
+    assert [p for p, _ in skipped] == [blocked]
+    assert blocked not in cache
+    assert len(records) == 3
+
+
+def test_join_by_local_uid_or_dataset_id():
+    rec = dict(kind="spatialdata", path="", version="", elements="", n_elements=0, details="")
+    records = [
+        scan_cluster.StoreRecord(uid="10u63", **rec),
+        scan_cluster.StoreRecord(uid="ds_ad03ab99d753", **rec),
+        scan_cluster.StoreRecord(uid="zzzzz", **rec),
+    ]
+    registry = [
+        {"dataset_id": "ds_1", "name": "A", "status": "uploaded", "local_uid": "10u63"},
+        {"dataset_id": "ds_ad03ab99d753", "name": "B", "status": "todo", "local_uid": ""},
+    ]
+    rows = scan_cluster.join_registry(records, registry, {"10u63"})
+    assert [r.dataset_id for r in rows] == ["ds_1", "ds_ad03ab99d753", ""]
+    assert [r.on_cluster_csv for r in rows] == [True, False, False]
+
+
+def test_missing_on_cluster_uses_local_uid():
+    registry = [
+        {"dataset_id": "", "name": "no id yet", "local_uid": "10u63"},
+        {"dataset_id": "ds_2", "name": "gone", "local_uid": "10u64"},
+        {"dataset_id": "ds_3", "name": "never uploaded", "local_uid": ""},
+    ]
+    missing = scan_cluster.missing_on_cluster(registry, {"10u63", "ds_9"})
+    assert [r["name"] for r in missing] == ["gone"]
@@ -0,0 +1,39 @@
+"""The sdb entry point dispatches to subcommands from any working directory."""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import sdb
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(sdb.__file__))
+REGISTRY = os.path.join(os.path.dirname(TOOLS_DIR), "registry", "datasets.csv")
+
+
+def test_merge_plan_from_any_directory(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", list(sys.argv))
+    assert sdb.main(["merge", "--plan", "--cache-dir", str(tmp_path / "cache")]) == 0
+    out = capsys.readouterr().out
+    assert "scripts/metadata/scraped_datasets.csv" in out
+    assert "- load      run" in out
+
+
+def test_unknown_command(capsys):
+    assert sdb.main(["frobnicate"]) == 2
+    assert "unknown command" in capsys.readouterr().err
+
+
+def test_lookup_does_not_import_heavy_modules(tmp_path):
+    # A fresh interpreter: this test process has pandas loaded by other tests.
+    code = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import sdb\n"
+        "rc = sdb.main(['lookup', sys.argv[2], '10.1038/s41586-020-03167-3'])\n"
+        "heavy = sorted({'pandas', 'lamindb', 'requests', 'bs4'} & set(sys.modules))\n"
+        "print('HEAVY', heavy); sys.exit(rc)"
+    )
+    proc = subprocess.run([sys.executable, "-c", code, TOOLS_DIR, REGISTRY],
+                          cwd=tmp_path, capture_output=True, text=True, check=False)
+    assert proc.returncode in (0, 1), proc.stderr
+    assert "HEAVY []" in proc.stdout
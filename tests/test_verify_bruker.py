@@ -0,0 +1,115 @@
+"""verify_bruker on a small local mirror."""
+from __future__ import annotations
+
+import csv
+import hashlib
+import os
+
+import pytest
+
+import verify_bruker
+from group_bruker import STATUS_FIELDS
+
+MODIFIED = "2023-09-06T15:29:54.561Z"
+REMOTE_NS = verify_bruker.parse_modified(MODIFIED)
+
+
+def put(root, key: str, data: bytes, mtime_ns: int) -> None:
+    path = root / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def md5(data: bytes) -> str:
+    return hashlib.md5(data).hexdigest()
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    root = tmp_path / "mirror"
+    files = {
+        "alpha/exact.bin": (b"exact", REMOTE_NS),  # mtime == bucket last_modified
+        "alpha/aws.bin": (b"aws", REMOTE_NS - 1),  # aws s3 sync float rounding
+        "alpha/wget.bin": (b"wget", REMOTE_NS // 10**9 * 10**9),  # whole seconds
+        "alpha/old.bin": (b"old", REMOTE_NS - 86_400 * 10**9),  # suspect, but the content is right
+        "beta/corrupt.bin": (b"corrupt", REMOTE_NS),
+        "gamma/short.bin": (b"short", REMOTE_NS),
+        "delta/noetag.bin": (b"noetag", REMOTE_NS),
+    }
+    for key, (data, mtime_ns) in files.items():
+        put(root, key, data, mtime_ns)
+    entries = [(key, len(data), MODIFIED) for key, (data, _) in files.items()]
+    entries[entries.index(("gamma/short.bin", 5, MODIFIED))] = ("gamma/short.bin", 50, MODIFIED)
+    entries += [("beta/", 0, MODIFIED), ("beta/missing.bin", 7, MODIFIED)]
+    etags = {key: md5(data) for key, (data, _) in files.items() if not key.startswith("delta/")}
+    etags["beta/corrupt.bin"] = md5(b"something else")
+    return root, entries, etags
+
+
+def run(root, entries, etags, cache):
+    local = verify_bruker.scan_mirror(str(root), workers=4)
+    results = verify_bruker.verify(entries, local, cache, workers=4, etags=etags)
+    return {r.key: r.state for r in results}
+
+
+def test_verify_states(mirror):
+    root, entries, etags = mirror
+    states = run(root, entries, etags, {})
+    assert states == {
+        "alpha/exact.bin": "ok",
+        "alpha/aws.bin": "ok",
+        "alpha/wget.bin": "ok",
+        "alpha/old.bin": "ok",
+        "beta/corrupt.bin": "corrupt",
+        "beta/missing.bin": "missing",
+        "gamma/short.bin": "size",
+        "delta/noetag.bin": "ok",
+    }
+
+
+def test_cached_rerun_hashes_nothing(mirror, monkeypatch):
+    root, entries, etags = mirror
+    cache: dict[str, dict] = {}
+    first = run(root, entries, etags, cache)
+
+    def no_hashing(path):
+        raise AssertionError(f"rehashed {path}")
+
+    monkeypatch.setattr(verify_bruker, "hash_file", no_hashing)
+    assert run(root, entries, etags, cache) == first
+
+
+def test_changed_without_etag(mirror):
+    root, entries, etags = mirror
+    cache: dict[str, dict] = {}
+    run(root, entries, etags, cache)
+    put(root, "delta/noetag.bin", b"NOETAG", REMOTE_NS + 10**9)
+    assert run(root, entries, etags, cache)["delta/noetag.bin"] == "changed"
+    # The first hash stays the reference until the file is restored
+    assert run(root, entries, etags, cache)["delta/noetag.bin"] == "changed"
+    put(root, "delta/noetag.bin", b"noetag", REMOTE_NS + 2 * 10**9)
+    assert run(root, entries, etags, cache)["delta/noetag.bin"] == "ok"
+
+
+def test_update_status_writes_verified(mirror, tmp_path):
+    root, entries, etags = mirror
+    local = verify_bruker.scan_mirror(str(root), workers=4)
+    verdicts = verify_bruker.group_results(verify_bruker.verify(entries, local, {}, 4, etags))
+    assert verdicts == {"alpha": "pass", "beta": "fail", "gamma": "fail", "delta": "pass"}
+
+    status = tmp_path / "status.csv"
+    with open(status, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=STATUS_FIELDS)
+        w.writeheader()
+        for gid in ("alpha", "beta", "gamma", "epsilon"):
+            w.writerow({"dataset_id": gid, "display_name": gid.title(), "downloaded": "yes",
+                        "verified": "pass" if gid == "epsilon" else "", "notes": ""})
+    verify_bruker.update_status(str(status), verdicts)
+    with open(status, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == STATUS_FIELDS
+    assert {r["dataset_id"]: r["verified"] for r in rows} == {
+        "alpha": "pass", "beta": "fail", "gamma": "fail", "epsilon": "pass",
+    }
+    assert all(r["downloaded"] == "yes" for r in rows)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Startup benchmark for `sdb lookup`.
+
+Runs the lookup subcommand in fresh interpreters and fails if its median wall
+time exceeds that of a bare `python -c pass` by more than the budget, so a
+heavy import sneaking into the lookup path (pandas, lamindb, ...) shows up in
+CI regardless of how fast the runner's interpreter starts. The benchmark also
+fails if the lookup itself errors (an exit code other than 0 "found" / 1 "not
+found", or a traceback, since an uncaught exception also exits with 1), so a
+broken import cannot pass by failing fast.
+
+Usage:
+    python tools/bench_startup.py [--runs N] [--budget-ms MS] [registry_csv]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+SDB = os.path.join(TOOLS_DIR, "sdb.py")
+REGISTRY_DEFAULT = os.path.join(os.path.dirname(TOOLS_DIR), "registry", "datasets.csv")
+BUDGET_MS = 100.0
+PROBE = "10.1038/s41586-020-03167-3"
+
+
+def lookup_ok(rc: int, stderr: str) -> bool:
+    return rc in (0, 1) and "Traceback" not in stderr
+
+
+def time_run(cmd: list[str]) -> tuple[float, int, str]:
+    """Wall time in ms, exit code and stderr of one run."""
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=False)
+    return (time.perf_counter() - t0) * 1000, proc.returncode, proc.stderr
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark `sdb lookup` startup latency.")
+    p.add_argument("registry", nargs="?", default=REGISTRY_DEFAULT, help="Path to registry/datasets.csv")
+    p.add_argument("--runs", type=int, default=15)
+    p.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Maximum median overhead over a bare interpreter")
+    args = p.parse_args()
+
+    baseline_cmd = [sys.executable, "-c", "pass"]
+    lookup_cmd = [sys.executable, SDB, "lookup", args.registry, PROBE]
+    _, rc, err = time_run(lookup_cmd)  # also warms the filesystem cache
+    if not lookup_ok(rc, err):
+        print(f"FAIL: sdb lookup exited with {rc}")
+        print(err.rstrip())
+        return 1
+    baseline = statistics.median(time_run(baseline_cmd)[0] for _ in range(args.runs))
+    runs = [time_run(lookup_cmd) for _ in range(args.runs)]
+    failed = [rc for _, rc, err in runs if not lookup_ok(rc, err)]
+    if failed:
+        print(f"FAIL: sdb lookup exited with {failed[0]} in {len(failed)} of {args.runs} runs")
+        return 1
+    lookup = statistics.median(ms for ms, _, _ in runs)
+
+    print(f"python -c pass: {baseline:.1f} ms (median of {args.runs})")
+    print(f"sdb lookup:     {lookup:.1f} ms (median of {args.runs})")
+    print(f"overhead:       {lookup - baseline:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if lookup - baseline > args.budget_ms:
+        print("FAIL: sdb lookup exceeds its startup budget")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
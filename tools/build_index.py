@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Build the payload and search index for the registry web page.
+
+Writes two gzip-compressed JSON files that docs/index.html loads instead of
+parsing the raw registry CSV on every visit:
+  - registry.json.gz: only the displayed and searched columns, stored
+    column-wise; repetitive columns are dictionary-encoded and tags are
+    pre-split into lists
+  - search.json.gz:   an inverted index over SEARCH_FIELDS (token -> row ids)
+    plus a trigram index (trigram -> token ids), so substring queries never
+    scan the rows
+
+The page renders as soon as the payload arrives, filtering the same
+SEARCH_FIELDS linearly, and switches to indexed search once the index has
+loaded. The build fails if the compressed files together exceed the size
+budget.
+
+Usage:
+    python tools/build_index.py [registry_csv] [out_dir] [--budget-kb KB]
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+
+from canon import load_registry
+
+REGISTRY_DEFAULT = "registry/datasets.csv"
+OUT_DEFAULT = "docs/data"
+BUDGET_KB = 256
+
+# payload key -> registry column
+DISPLAY_COLUMNS = {
+    "dataset_id": "dataset_id",
+    "status": "status",
+    "name": "name",
+    "short_description": "short_description",
+    "manufacturer": "manufacturer",
+    "product": "product",
+    "tags": "tags",
+    "primary_source": "primary_source",
+    "primary_fingerprint": "primary_fingerprint",
+    "local_uid": "local_uid",
+    "lamin_link": "lamin_link",
+    "created_at": "created_at",
+    "description": "description",
+    "replicate": "Replicate",
+    "software_name": "software_name",
+    "software_version": "software_version",
+}
+LIST_COLUMNS = {"tags"}
+# payload keys searched by both the index and the page's fallback filter
+SEARCH_FIELDS = (
+    "name", "short_description", "tags", "manufacturer", "product", "primary_source", "local_uid",
+    "lamin_link", "replicate", "software_name", "software_version",
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+GRAM = 3
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_payload(rows: list[dict[str, str]]) -> dict:
+    """Column-wise payload; a column is dictionary-encoded when that makes it smaller."""
+    data: dict[str, list] = {}
+    dicts: dict[str, list[str]] = {}
+    for key, col in DISPLAY_COLUMNS.items():
+        if key in LIST_COLUMNS:
+            values = [[t.strip() for t in (r.get(col) or "").split(",") if t.strip()] for r in rows]
+            vocab = sorted({t for v in values for t in v})
+            ids = {t: i for i, t in enumerate(vocab)}
+            dicts[key] = vocab
+            data[key] = [[ids[t] for t in v] for v in values]
+            continue
+        values = [(r.get(col) or "").strip() or None for r in rows]
+        distinct = sorted({v for v in values if v is not None})
+        if len(distinct) * 2 <= len(values):
+            ids = {v: i for i, v in enumerate(distinct)}
+            dicts[key] = distinct
+            data[key] = [None if v is None else ids[v] for v in values]
+        else:
+            data[key] = values
+    return {
+        "version": 1,
+        "n": len(rows),
+        "columns": list(DISPLAY_COLUMNS),
+        "search_fields": list(SEARCH_FIELDS),
+        "dicts": dicts,
+        "data": data,
+    }
+
+
+def build_search_index(rows: list[dict[str, str]]) -> dict:
+    """Inverted index token -> row ids, and trigram -> token ids over the vocabulary."""
+    postings: dict[str, set[int]] = {}
+    for i, r in enumerate(rows):
+        for field in SEARCH_FIELDS:
+            for tok in tokenize(r.get(DISPLAY_COLUMNS[field]) or ""):
+                postings.setdefault(tok, set()).add(i)
+    vocab = sorted(postings)
+    grams: dict[str, list[int]] = {}
+    for tid, tok in enumerate(vocab):
+        for g in sorted({tok[j:j + GRAM] for j in range(len(tok) - GRAM + 1)}):
+            grams.setdefault(g, []).append(tid)
+    return {
+        "version": 1,
+        "fields": list(SEARCH_FIELDS),
+        "gram": GRAM,
+        "vocab": vocab,
+        "postings": [sorted(postings[t]) for t in vocab],
+        "grams": grams,
+    }
+
+
+def write_gz_json(path: str, obj: dict) -> int:
+    raw = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    # mtime=0 keeps the output byte-identical when the registry has not changed
+    with open(path, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb", compresslevel=9, mtime=0) as gz:
+        gz.write(raw)
+    return os.path.getsize(path)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Build the registry page payload and search index.")
+    p.add_argument("registry", nargs="?", default=REGISTRY_DEFAULT, help="Path to registry/datasets.csv")
+    p.add_argument("out_dir", nargs="?", default=OUT_DEFAULT, help="Output directory")
+    p.add_argument("--budget-kb", type=float, default=BUDGET_KB, help="Maximum compressed size of both files")
+    args = p.parse_args()
+
+    rows = load_registry(args.registry)
+    os.makedirs(args.out_dir, exist_ok=True)
+    payload_path = os.path.join(args.out_dir, "registry.json.gz")
+    index_path = os.path.join(args.out_dir, "search.json.gz")
+    payload_size = write_gz_json(payload_path, build_payload(rows))
+    index_size = write_gz_json(index_path, build_search_index(rows))
+    total_kb = (payload_size + index_size) / 1024
+
+    print(f"Wrote {payload_path} ({payload_size / 1024:.1f} KB, {len(rows)} rows)")
+    print(f"Wrote {index_path} ({index_size / 1024:.1f} KB)")
+    if total_kb > args.budget_kb:
+        print(f"ERROR: payload size {total_kb:.1f} KB exceeds budget of {args.budget_kb:.0f} KB")
+        return 1
+    print(f"OK: {total_kb:.1f} KB within budget of {args.budget_kb:.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""Discover new vendor dataset pages and emit candidate registry rows.
+
+Starts from vendor listing pages or sitemaps, follows pagination (rel="next"
+links, nested sitemaps) and collects links that look like dataset detail pages.
+Candidates are deduplicated by canon.canonical_source fingerprint against
+registry/datasets.csv *before* their detail pages are fetched, so known datasets
+cost nothing. Only new detail pages, and pages whose title/description changed
+since the last run, are written out, as rows in the scraped_datasets.csv schema.
+
+Requests run on a thread pool with a minimum delay per host, and are
+conditional (If-None-Match / If-Modified-Since) against the ETags stored in the
+crawl state file, so unchanged pages come back as 304.
+
+Usage:
+    python tools/crawl_vendors.py [--config vendors.json] [--registry CSV] [--state JSON]
+                                  [--output CSV] [--workers N] [--delay SECONDS]
+
+The config is a list of vendors:
+    [{"manufacturer": "10x Genomics",
+      "seeds": ["https://www.10xgenomics.com/datasets"],
+      "detail_pattern": "^https://10xgenomics\\\\.com/datasets/[^/?#]+$"}]
+`detail_pattern` is matched against the canonical URL.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date
+from html.parser import HTMLParser
+
+from canon import canonical_source, fingerprint, index_by_fingerprint, load_registry
+
+REGISTRY_DEFAULT = "registry/datasets.csv"
+STATE_DEFAULT = "registry/crawl_state.json"
+OUTPUT_DEFAULT = "crawl_candidates.csv"
+TIMEOUT = 20
+DELAY = 0.8
+USER_AGENT = "Mozilla/5.0 (compatible; spatialdata-db-curation crawler)"
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+DEFAULT_VENDORS = [
+    {
+        "manufacturer": "10x Genomics",
+        "seeds": ["https://www.10xgenomics.com/datasets"],
+        "detail_pattern": r"^https://10xgenomics\.com/datasets/[^/?#]+$",
+    },
+]
+
+CANDIDATE_FIELDS = [
+    "status", "dataset_id", "name", "short_description", "primary_source_type", "primary_source",
+    "primary_fingerprint", "doi", "pmid", "manufacturer", "product", "release_date", "tags",
+    "last_updated", "lamin_link", "notes",
+]
+
+
+@dataclass
+class Vendor:
+    manufacturer: str
+    seeds: list[str]
+    detail_pattern: re.Pattern[str]
+
+
+@dataclass
+class Fetched:
+    url: str
+    status: int  # 200, 304, or 0 on error
+    body: bytes = b""
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+class HostLimiter:
+    """Hands out request slots at most once every `delay` seconds per host."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.next_slot: dict[str, float] = {}
+
+    def wait(self, url: str) -> None:
+        host = urllib.parse.urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PageParser(HTMLParser):
+    """Collects links, rel=next, <title> and description/og meta tags."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.links: list[str] = []
+        self.next: list[str] = []
+        self.meta: dict[str, str] = {}
+        self.title = ""
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        a = {k: v or "" for k, v in attrs}
+        if tag == "a" and a.get("href"):
+            self.links.append(a["href"])
+            if "next" in a.get("rel", "").split():
+                self.next.append(a["href"])
+        elif tag == "link" and "next" in a.get("rel", "").split() and a.get("href"):
+            self.next.append(a["href"])
+        elif tag == "meta":
+            key = (a.get("property") or a.get("name") or "").lower()
+            if key in ("description", "og:title", "og:description") and key not in self.meta:
+                self.meta[key] = a.get("content", "").strip()
+        elif tag == "title":
+            self._in_title = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self.title += data
+
+
+def fetch(url: str, prev: dict, limiter: HostLimiter) -> Fetched:
+    """Conditional GET using the validators stored in `prev`."""
+    headers = {"User-Agent": USER_AGENT}
+    if prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+    limiter.wait(url)
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=TIMEOUT) as resp:
+            return Fetched(url, resp.status, resp.read(), {k.lower(): v for k, v in resp.headers.items()})
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return Fetched(url, 304)
+        print(f"  HTTP {e.code}: {url}")
+    except (OSError, http.client.HTTPException) as e:
+        # URLError, timeouts and resets are OSErrors; malformed responses and
+        # truncated bodies raise HTTPException
+        print(f"  error: {url}: {e!r}")
+    return Fetched(url, 0)
+
+
+def parse_listing(f: Fetched) -> tuple[list[str], list[str]]:
+    """Return (links, pages to follow) of a listing page or sitemap."""
+    ctype = f.headers.get("content-type", "")
+    if "xml" in ctype or f.body.lstrip().startswith(b"<?xml"):
+        try:
+            root = ET.fromstring(f.body)
+        except ET.ParseError:
+            return [], []
+        locs = [el.text.strip() for el in root.iter(f"{SITEMAP_NS}loc") if el.text]
+        if root.tag == f"{SITEMAP_NS}sitemapindex":
+            return [], locs
+        return locs, []
+    p = PageParser()
+    p.feed(f.body.decode("utf-8", errors="replace"))
+    return [urllib.parse.urljoin(f.url, h) for h in p.links], [urllib.parse.urljoin(f.url, h) for h in p.next]
+
+
+def parse_detail(f: Fetched) -> dict[str, str]:
+    p = PageParser()
+    p.feed(f.body.decode("utf-8", errors="replace"))
+    return {
+        "name": p.meta.get("og:title") or " ".join(p.title.split()),
+        "short_description": p.meta.get("og:description") or p.meta.get("description", ""),
+    }
+
+
+def remember(state: dict[str, dict], key: str, f: Fetched, **extra) -> None:
+    entry = {k: v for k, v in state.get(key, {}).items() if k not in ("etag", "last_modified")}
+    if f.headers.get("etag"):
+        entry["etag"] = f.headers["etag"]
+    if f.headers.get("last-modified"):
+        entry["last_modified"] = f.headers["last-modified"]
+    entry.update(extra)
+    state[key] = entry
+
+
+def crawl(
+    vendors: list[Vendor],
+    known_fps: set[str],
+    state: dict[str, dict],
+    workers: int,
+    delay: float,
+) -> list[dict[str, str]]:
+    """Crawl all vendors and return new or changed candidate rows."""
+    limiter = HostLimiter(delay)
+    today = date.today().isoformat()
+    rows: list[dict[str, str]] = []
+    seen_pages: set[str] = set()
+    seen_fps: set[str] = set(known_fps)
+    stats = {"pages": 0, "not_modified": 0, "known": 0, "details": 0}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: dict = {}
+
+        # Listing pages are keyed in the state by URL, detail pages by canonical
+        # URL so that the same page reached through different links shares one entry.
+        def submit(url: str, kind: str, vendor: Vendor, key: str, fp: str = "") -> None:
+            pending[pool.submit(fetch, url, state.get(key, {}), limiter)] = (kind, vendor, key, fp)
+
+        for v in vendors:
+            for seed in v.seeds:
+                seen_pages.add(seed)
+                submit(seed, "listing", v, seed)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, vendor, key, fp = pending.pop(fut)
+                f = fut.result()
+                stats["pages"] += 1
+                if f.status == 0:
+                    continue
+                if f.status == 304:
+                    stats["not_modified"] += 1
+
+                if kind == "listing":
+                    if f.status == 304:
+                        links, follow = state[key].get("links", []), state[key].get("follow", [])
+                    else:
+                        links, follow = parse_listing(f)
+                        remember(state, key, f, links=links, follow=follow)
+                    for url in follow:
+                        if url not in seen_pages:
+                            seen_pages.add(url)
+                            submit(url, "listing", vendor, url)
+                    for url in links:
+                        c = canonical_source(url)
+                        if c is None or not vendor.detail_pattern.search(c):
+                            continue
+                        cfp = fingerprint(c)
+                        if cfp in seen_fps:
+                            if cfp in known_fps:
+                                stats["known"] += 1
+                            continue
+                        seen_fps.add(cfp)
+                        submit(url, "detail", vendor, c, cfp)
+                    continue
+
+                # Detail page
+                stats["details"] += 1
+                if f.status == 304:
+                    continue
+                info = parse_detail(f)
+                digest = hashlib.sha1(json.dumps(info, sort_keys=True).encode("utf-8")).hexdigest()
+                previous = state.get(key, {}).get("hash")
+                remember(state, key, f, hash=digest)
+                if previous == digest:
+                    continue
+                rows.append({
+                    "status": "todo",
+                    "dataset_id": f"ds_{fp}",
+                    "name": info["name"],
+                    "short_description": info["short_description"],
+                    "primary_source_type": "url",
+                    "primary_source": key,
+                    "primary_fingerprint": fp,
+                    "manufacturer": vendor.manufacturer,
+                    "last_updated": today,
+                    "notes": "changed" if previous else "new",
+                })
+
+    print(
+        f"Fetched {stats['pages']} pages ({stats['not_modified']} not modified), "
+        f"{stats['details']} detail pages, {stats['known']} links already in registry"
+    )
+    rows.sort(key=lambda r: r["primary_source"])
+    return rows
+
+
+def load_vendors(path: str | None) -> list[Vendor]:
+    config = DEFAULT_VENDORS
+    if path:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    return [Vendor(c["manufacturer"], list(c["seeds"]), re.compile(c["detail_pattern"])) for c in config]
+
+
+def load_state(path: str) -> dict[str, dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(path: str, state: dict[str, dict]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Discover new vendor dataset pages.")
+    p.add_argument("--config", help="Vendor config JSON (default: built-in vendor list)")
+    p.add_argument("--registry", default=REGISTRY_DEFAULT, help="Path to registry/datasets.csv")
+    p.add_argument("--state", default=STATE_DEFAULT, help="Crawl state (ETags, listing links, page hashes)")
+    p.add_argument("--output", default=OUTPUT_DEFAULT, help="CSV of new or changed candidates")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--delay", type=float, default=DELAY, help="Minimum seconds between requests to one host")
+    args = p.parse_args()
+
+    vendors = load_vendors(args.config)
+    known_fps = set(index_by_fingerprint(load_registry(args.registry)))
+    state = load_state(args.state)
+
+    rows = crawl(vendors, known_fps, state, args.workers, args.delay)
+    save_state(args.state, state)
+
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=CANDIDATE_FIELDS, restval="")
+        w.writeheader()
+        w.writerows(rows)
+    n_new = sum(1 for r in rows if r["notes"] == "new")
+    print(f"Wrote {len(rows)} candidates ({n_new} new, {len(rows) - n_new} changed) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,10 @@ Usage:
     python tools/fetch_bruker.py [output_path]
 
 Output format (no header, tab-separated):
-    key <TAB> size_bytes <TAB> last_modified
+    key <TAB> size_bytes <TAB> last_modified <TAB> etag
+
+The ETag is written without quotes. For single-part uploads it is the MD5 of
+the object, which verify_bruker.py checks local files against.
 """
 from __future__ import annotations
 
@@ -18,9 +21,9 @@ BUCKET_URL = "https://smi-public.objects.liquidweb.services/"
 NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
 
 
-def fetch_all_entries(bucket_url: str) -> list[tuple[str, str, str]]:
-    """Return list of (key, size_bytes, last_modified) for all objects in bucket."""
-    entries: list[tuple[str, str, str]] = []
+def fetch_all_entries(bucket_url: str) -> list[tuple[str, str, str, str]]:
+    """Return list of (key, size_bytes, last_modified, etag) for all objects in bucket."""
+    entries: list[tuple[str, str, str, str]] = []
     marker = ""
 
     while True:
@@ -37,9 +40,11 @@ def fetch_all_entries(bucket_url: str) -> list[tuple[str, str, str]]:
             key_el = contents.find(f"{NS}Key")
             size_el = contents.find(f"{NS}Size")
             mod_el = contents.find(f"{NS}LastModified")
+            etag_el = contents.find(f"{NS}ETag")
             if key_el is None or size_el is None or mod_el is None:
                 continue
-            entries.append((key_el.text or "", size_el.text or "0", mod_el.text or ""))
+            etag = (etag_el.text or "").strip('"') if etag_el is not None else ""
+            entries.append((key_el.text or "", size_el.text or "0", mod_el.text or "", etag))
 
         is_truncated = root.find(f"{NS}IsTruncated")
         if is_truncated is not None and is_truncated.text.lower() == "true" and entries:
@@ -55,8 +60,8 @@ def main() -> int:
     print(f"Fetching {BUCKET_URL} ...")
     entries = fetch_all_entries(BUCKET_URL)
     with open(out_path, "w", encoding="utf-8") as f:
-        for key, size, modified in entries:
-            f.write(f"{key}\t{size}\t{modified}\n")
+        for key, size, modified, etag in entries:
+            f.write(f"{key}\t{size}\t{modified}\t{etag}\n")
     print(f"Wrote {len(entries)} entries to {out_path}")
     return 0
 
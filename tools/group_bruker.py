@@ -36,7 +36,7 @@ TOP_LEVEL_RULES: list[tuple[re.Pattern[str], str]] = [
     (re.compile(r"^logs\.", re.IGNORECASE), "misc"),
 ]
 
-STATUS_FIELDS = ["dataset_id", "display_name", "downloaded", "converted_to_spatialdata", "uploaded_to_lamin", "notes"]
+STATUS_FIELDS = ["dataset_id", "display_name", "downloaded", "converted_to_spatialdata", "uploaded_to_lamin", "verified", "notes"]
 
 
 def make_display_name(group_id: str) -> str:
@@ -206,6 +206,7 @@ def merge_status(dataset_ids: list[str], display_names: dict[str, str], csv_path
                 "downloaded": "",
                 "converted_to_spatialdata": "",
                 "uploaded_to_lamin": "",
+                "verified": "",
                 "notes": "",
             })
 
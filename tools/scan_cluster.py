@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Scan cluster storage for SpatialData stores and raw bundles and reconcile
+them with the registry.
+
+Walks one or more storage roots in parallel (one directory per task) and
+classifies directories without descending into them once recognised:
+  - spatialdata: a zarr store (`*.zarr`, or a directory with .zattrs/.zgroup/zarr.json)
+  - xenium:      a Xenium output bundle (contains experiment.xenium)
+  - visium:      a Space Ranger `outs` directory (metrics_summary.csv + spatial/)
+  - cosmx:       a CosMx flat-file export (*_exprMat_file.csv[.gz])
+Only small metadata files are read. Results are cached by path and the mtimes
+of the files each record was built from, so rescans only re-read what changed.
+
+The inventory is written as CSV, joined to registry/datasets.csv by
+`local_uid` (the store/bundle name up to the first "__" or ".", e.g.
+`10u63__10X__Xenium__...` or `10u63.zarr`) or, failing that, by `dataset_id`
+(stores named `ds_<fingerprint>.zarr`), and compared with the hand-exported
+scripts/metadata/on_cluster.csv. Directories that cannot be read are reported
+and skipped; they are not cached, so they are retried on the next scan.
+
+Usage:
+    python tools/scan_cluster.py ROOT [ROOT ...] [--registry CSV] [--on-cluster CSV]
+                                 [--output CSV] [--cache PATH] [--workers N]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, fields
+
+from canon import load_registry
+
+REGISTRY_DEFAULT = "registry/datasets.csv"
+ON_CLUSTER_DEFAULT = "scripts/metadata/on_cluster.csv"
+OUTPUT_DEFAULT = "cluster_inventory.csv"
+CACHE_DEFAULT = ".cluster_scan_cache.json"
+
+ZARR_MARKERS = (".zattrs", ".zgroup", "zarr.json")
+SDATA_ELEMENTS = ("images", "labels", "points", "shapes", "tables")
+
+
+@dataclass
+class StoreRecord:
+    uid: str
+    kind: str  # spatialdata | xenium | visium | cosmx
+    path: str
+    version: str
+    elements: str  # "<group>/<name>|..." for SpatialData stores
+    n_elements: int
+    details: str  # small JSON blob of kind-specific metadata
+
+
+@dataclass
+class InventoryRow(StoreRecord):
+    dataset_id: str
+    name: str
+    status: str
+    on_cluster_csv: bool
+
+
+def uid_from_name(name: str) -> str:
+    return name.split("__")[0].split(".")[0]
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _list_subdirs(path: str) -> list[str]:
+    try:
+        with os.scandir(path) as it:
+            return sorted(e.name for e in it if e.is_dir() and not e.name.startswith("."))
+    except OSError:
+        return []
+
+
+def classify_dir(path: str, names: set[str]) -> tuple[str, list[str]] | None:
+    """Return (kind, watched relative paths) if `path` is a store or bundle."""
+    base = os.path.basename(path)
+    if base.endswith(".zarr") or any(m in names for m in ZARR_MARKERS):
+        watch = [m for m in ZARR_MARKERS if m in names] + [g for g in SDATA_ELEMENTS if g in names]
+        return "spatialdata", watch
+    if "experiment.xenium" in names:
+        return "xenium", ["experiment.xenium"]
+    if "metrics_summary.csv" in names and "spatial" in names:
+        return "visium", ["metrics_summary.csv"]
+    expr = sorted(n for n in names if n.endswith(("_exprMat_file.csv", "_exprMat_file.csv.gz")))
+    if expr:
+        return "cosmx", expr[:1]
+    return None
+
+
+def read_record(path: str, kind: str, names: set[str]) -> StoreRecord:
+    base = os.path.basename(path)
+    if kind == "visium" and base == "outs":
+        base = os.path.basename(os.path.dirname(path))
+    uid = uid_from_name(base)
+    version = ""
+    elements: list[str] = []
+    details: dict = {}
+
+    if kind == "spatialdata":
+        attrs = _read_json(os.path.join(path, ".zattrs"))
+        if not attrs and "zarr.json" in names:
+            attrs = _read_json(os.path.join(path, "zarr.json")).get("attributes", {})
+        sd_attrs = attrs.get("spatialdata_attrs", {})
+        version = str(sd_attrs.get("version", ""))
+        for group in SDATA_ELEMENTS:
+            if group in names:
+                elements.extend(f"{group}/{n}" for n in _list_subdirs(os.path.join(path, group)))
+    elif kind == "xenium":
+        exp = _read_json(os.path.join(path, "experiment.xenium"))
+        version = str(exp.get("analysis_sw_version", ""))
+        details = {k: exp[k] for k in ("run_name", "region_name", "panel_name", "num_cells") if k in exp}
+    elif kind == "visium":
+        try:
+            with open(os.path.join(path, "metrics_summary.csv"), newline="", encoding="utf-8") as f:
+                metrics = next(csv.DictReader(f), {})
+        except OSError:
+            metrics = {}
+        details = {k: metrics[k] for k in ("Sample ID", "Number of Spots Under Tissue") if k in metrics}
+
+    return StoreRecord(
+        uid=uid,
+        kind=kind,
+        path=path,
+        version=version,
+        elements="|".join(elements),
+        n_elements=len(elements),
+        details=json.dumps(details, sort_keys=True) if details else "",
+    )
+
+
+def _stamp(path: str, rel_paths: list[str]) -> list[int]:
+    stamp = []
+    for rel in rel_paths:
+        try:
+            stamp.append(os.stat(os.path.join(path, rel)).st_mtime_ns)
+        except OSError:
+            stamp.append(-1)
+    return stamp
+
+
+def scan(
+    roots: list[str], cache: dict[str, dict], workers: int
+) -> tuple[list[StoreRecord], dict[str, dict], int, list[tuple[str, str]]]:
+    """Walk `roots` and return (records, new cache, directories re-read, skipped).
+
+    `skipped` lists (path, error) for directories that could not be read.
+
+    Cache entries are keyed by path and hold the mtimes ("stamp") of the
+    directory and of the files the entry was built from. A plain directory whose
+    mtime is unchanged reuses its cached child list; a store whose stamp is
+    unchanged reuses its cached record.
+    """
+    new_cache: dict[str, dict] = {}
+    records: list[StoreRecord] = []
+    skipped: list[tuple[str, str]] = []
+    rescanned = 0
+
+    def visit(path: str) -> tuple[str, dict | str, bool]:
+        cached = cache.get(path)
+        if cached is not None and _stamp(path, ["."] + cached["watch"]) == cached["stamp"]:
+            return path, cached, False
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError as e:
+            return path, f"{type(e).__name__}: {e.strerror or e}", False
+        names = {e.name for e in entries}
+        found = classify_dir(path, names)
+        if found is not None:
+            kind, watch = found
+            entry = {"watch": watch, "record": asdict(read_record(path, kind, names)), "subdirs": []}
+        else:
+            subdirs = sorted(e.name for e in entries if e.is_dir(follow_symlinks=False) and not e.name.startswith("."))
+            entry = {"watch": [], "record": None, "subdirs": subdirs}
+        entry["stamp"] = _stamp(path, ["."] + entry["watch"])
+        return path, entry, True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(visit, os.path.abspath(r)) for r in roots}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                path, entry, fresh = fut.result()
+                if isinstance(entry, str):
+                    skipped.append((path, entry))
+                    continue
+                new_cache[path] = entry
+                rescanned += fresh
+                if entry["record"] is not None:
+                    records.append(StoreRecord(**entry["record"]))
+                pending.update(pool.submit(visit, os.path.join(path, d)) for d in entry["subdirs"])
+
+    records.sort(key=lambda r: (r.uid, r.path))
+    skipped.sort()
+    return records, new_cache, rescanned, skipped
+
+
+def load_on_cluster(path: str) -> set[str]:
+    """uids listed in the semicolon-separated (possibly ragged) on_cluster.csv."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f, delimiter=";")
+        header = next(reader, [])
+        if "uid" not in header:
+            return set()
+        col = header.index("uid")
+        return {row[col].strip() for row in reader if len(row) > col and row[col].strip()}
+
+
+def join_registry(
+    records: list[StoreRecord], registry: list[dict[str, str]], on_cluster: set[str]
+) -> list[InventoryRow]:
+    by_uid = {r["local_uid"].strip(): r for r in registry if (r.get("local_uid") or "").strip()}
+    by_id = {r["dataset_id"].strip(): r for r in registry if (r.get("dataset_id") or "").strip()}
+    rows = []
+    for rec in records:
+        reg = by_uid.get(rec.uid) or by_id.get(rec.uid, {})
+        rows.append(InventoryRow(
+            **asdict(rec),
+            dataset_id=reg.get("dataset_id", ""),
+            name=reg.get("name", ""),
+            status=reg.get("status", ""),
+            on_cluster_csv=rec.uid in on_cluster,
+        ))
+    return rows
+
+
+def missing_on_cluster(registry: list[dict[str, str]], found: set[str]) -> list[dict[str, str]]:
+    """Registry rows with a local_uid that no scanned store or bundle has."""
+    return [r for r in registry if (uid := (r.get("local_uid") or "").strip()) and uid not in found]
+
+
+def load_cache(path: str) -> dict[str, dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_cache(path: str, cache: dict[str, dict]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def write_inventory(path: str, rows: list[InventoryRow]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=[fl.name for fl in fields(InventoryRow)])
+        w.writeheader()
+        for r in rows:
+            w.writerow(asdict(r))
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Scan cluster storage and reconcile it with the registry.")
+    p.add_argument("roots", nargs="+", help="Storage roots to scan")
+    p.add_argument("--registry", default=REGISTRY_DEFAULT, help="Path to registry/datasets.csv")
+    p.add_argument("--on-cluster", default=ON_CLUSTER_DEFAULT, help="Hand-exported on_cluster.csv")
+    p.add_argument("--output", default=OUTPUT_DEFAULT, help="Inventory CSV to write")
+    p.add_argument("--cache", default=CACHE_DEFAULT, help="Scan cache (path+mtime)")
+    p.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) + 4))
+    args = p.parse_args()
+
+    cache = load_cache(args.cache)
+    records, cache, rescanned, skipped = scan(args.roots, cache, args.workers)
+    save_cache(args.cache, cache)
+    print(f"Scanned {len(cache)} directories ({rescanned} re-read), found {len(records)} stores/bundles")
+    if skipped:
+        print(f"Skipped {len(skipped)} unreadable directories:")
+        for path, err in skipped:
+            print(f"  {path}: {err}")
+
+    registry = load_registry(args.registry)
+    try:
+        on_cluster = load_on_cluster(args.on_cluster)
+    except FileNotFoundError:
+        on_cluster = set()
+    rows = join_registry(records, registry, on_cluster)
+    write_inventory(args.output, rows)
+    print(f"Wrote {args.output}")
+
+    found = {r.uid for r in rows}
+    missing = missing_on_cluster(registry, found)
+    print(f"- In registry: {len({r.uid for r in rows if r.dataset_id})}")
+    print(f"- Not in registry: {len({r.uid for r in rows if not r.dataset_id})}")
+    print(f"- Registry local_uid not found on cluster: {len(missing)}")
+    print(f"- Listed in {args.on_cluster} but not found: {len(on_cluster - found)}")
+    print(f"- Found but not listed in {args.on_cluster}: {len(found - on_cluster)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Single entry point for the curation tools.
+
+Subcommand modules are imported only when their subcommand runs, so
+`sdb lookup` never pays for pandas or lamindb. Pass --timings to print how
+long the subcommand's import took.
+
+Usage:
+    python tools/sdb.py [--timings] <command> [args ...]
+    python tools/sdb.py --help
+"""
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(TOOLS_DIR), "scripts")
+
+# name -> (module, directory holding it, call style, summary)
+# "argv": module.main() parses sys.argv itself; "path": module.main(path)
+COMMANDS: dict[str, tuple[str, str, str, str]] = {
+    "lookup": ("lookup", TOOLS_DIR, "argv", "Look up a DOI or URL in the registry"),
+    "validate": ("validate", TOOLS_DIR, "path", "Check registry columns and cross-ID duplicates"),
+    "dup-report": ("dup_report", TOOLS_DIR, "path", "Markdown report of duplicate fingerprints"),
+    "fetch-bruker": ("fetch_bruker", TOOLS_DIR, "argv", "Fetch the Bruker S3 bucket listing"),
+    "group-bruker": ("group_bruker", TOOLS_DIR, "argv", "Group the Bruker listing into datasets"),
+    "verify-bruker": ("verify_bruker", TOOLS_DIR, "argv", "Verify a local Bruker mirror"),
+    "scan-cluster": ("scan_cluster", TOOLS_DIR, "argv", "Scan cluster storage and reconcile with the registry"),
+    "crawl-vendors": ("crawl_vendors", TOOLS_DIR, "argv", "Discover new vendor dataset pages"),
+    "build-index": ("build_index", TOOLS_DIR, "argv", "Build the registry page payload and search index"),
+    "merge": ("create_merged_datasets", SCRIPTS_DIR, "argv", "Build metadata/datasets_merged.csv"),
+}
+
+
+def usage() -> str:
+    lines = ["usage: sdb [--timings] <command> [args ...]", "", "commands:"]
+    width = max(len(n) for n in COMMANDS)
+    for name, (_, _, _, summary) in COMMANDS.items():
+        lines.append(f"  {name:<{width}}  {summary}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    timings = False
+    if argv and argv[0] == "--timings":
+        timings = True
+        argv = argv[1:]
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    name, args = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"sdb: unknown command '{name}'\n", file=sys.stderr)
+        print(usage(), file=sys.stderr)
+        return 2
+    module_name, directory, style, _ = COMMANDS[name]
+
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    t0 = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if timings:
+        print(f"sdb: imported {module_name} in {(time.perf_counter() - t0) * 1000:.1f} ms", file=sys.stderr)
+
+    if style == "path":
+        if len(args) != 1 or args[0] in ("-h", "--help"):
+            print(f"usage: sdb {name} <registry.csv>", file=sys.stderr)
+            return 2
+        rc = module.main(args[0])
+    else:
+        sys.argv = [f"sdb {name}"] + args
+        rc = module.main()
+    return rc or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Verify a local mirror of the Bruker SMI bucket against the bucket listing.
+
+Compares every object in the TSV produced by fetch_bruker.py with the file at
+the same key below the mirror root:
+  - a quick size pass flags files that are missing or have the wrong size;
+  - files that are new, whose size/mtime changed since the last run, or that
+    are more than a second older than the object in the bucket (suspect) are
+    hashed (MD5, memory-mapped, on a thread pool); hashes are kept in a sidecar
+    cache so later runs only rehash what changed.
+
+The mtime is never a verdict on its own: downloaders round it (wget and
+`curl -R` to whole seconds, `aws s3 sync` through a float), so a file with the
+right content routinely looks slightly older than the bucket object.
+
+Where the listing carries the object's ETag (fourth TSV column, written by
+fetch_bruker.py) and the object was a single-part upload, the ETag is the MD5 of
+its content and every file is checked against it ("corrupt" on mismatch).
+Multipart ETags ("<md5>-<parts>") are not content hashes; for those objects,
+and for listings without ETags, hashing can only detect files that changed
+after their first verification: the first hash is taken as the reference.
+
+Per-group results are written to the `verified` column of
+registry/bruker_status.csv ("pass" or "fail"). Groups without any local files
+are left untouched.
+
+Usage:
+    python tools/verify_bruker.py <mirror_root> [files_tsv] [status_csv] [--cache PATH] [--workers N]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime
+
+from group_bruker import FILES_DEFAULT, STATUS_DEFAULT, STATUS_FIELDS, classify, load_tsv
+
+CACHE_NAME = ".bruker_hashes.json"
+HASH_CHUNK = 64 * 1024 * 1024
+# Local mtimes this much older than the bucket's last_modified make a file suspect
+MTIME_TOLERANCE_NS = 1_000_000_000
+
+
+@dataclass
+class LocalFile:
+    path: str
+    size: int
+    mtime_ns: int
+
+
+@dataclass
+class FileResult:
+    key: str
+    state: str  # ok | missing | size | corrupt | changed
+    detail: str = ""
+
+
+def scan_mirror(root: str, workers: int) -> dict[str, LocalFile]:
+    """Walk `root` with os.scandir, one directory per task, and index files by bucket key."""
+    found: dict[str, LocalFile] = {}
+
+    def scan_dir(path: str) -> tuple[list[LocalFile], list[str]]:
+        files: list[LocalFile] = []
+        dirs: list[str] = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.is_file():
+                    st = entry.stat()
+                    files.append(LocalFile(entry.path, st.st_size, st.st_mtime_ns))
+        return files, dirs
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(scan_dir, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                files, dirs = fut.result()
+                for lf in files:
+                    key = os.path.relpath(lf.path, root).replace(os.sep, "/")
+                    found[key] = lf
+                pending.update(pool.submit(scan_dir, d) for d in dirs)
+    return found
+
+
+def hash_file(path: str) -> str:
+    """MD5 of a file via mmap."""
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return h.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for start in range(0, len(view), HASH_CHUNK):
+                    h.update(view[start:start + HASH_CHUNK])
+            finally:
+                view.release()
+    return h.hexdigest()
+
+
+def load_cache(path: str) -> dict[str, dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_cache(path: str, cache: dict[str, dict]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def load_etags(path: str) -> dict[str, str]:
+    """Single-part ETags (content MD5) from the listing TSV, keyed by object key."""
+    etags: dict[str, str] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 4 and parts[3] and "-" not in parts[3]:
+                etags[parts[0]] = parts[3].lower()
+    return etags
+
+
+def parse_modified(value: str) -> int | None:
+    """Bucket `last_modified` ('2023-09-06T15:29:54.561Z') as epoch nanoseconds."""
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return int(dt.timestamp() * 1_000_000_000)
+
+
+def verify(
+    entries: list[tuple[str, int, str]],
+    local: dict[str, LocalFile],
+    cache: dict[str, dict],
+    workers: int,
+    etags: dict[str, str] | None = None,
+) -> list[FileResult]:
+    """Check listing entries against local files, updating `cache` in place.
+
+    `etags` maps keys to the expected MD5 of single-part objects. Cached hashes
+    are reused only for the same local size/mtime and the same bucket object.
+    """
+    etags = etags or {}
+    results: list[FileResult] = []
+    to_hash: list[tuple[str, LocalFile, str]] = []
+
+    for key, size, modified in entries:
+        if size == 0 and key.endswith("/"):
+            continue
+        lf = local.get(key)
+        if lf is None:
+            results.append(FileResult(key, "missing"))
+            continue
+        if lf.size != size:
+            results.append(FileResult(key, "size", f"local {lf.size} != bucket {size}"))
+            continue
+        remote_ns = parse_modified(modified)
+        suspect = remote_ns is not None and lf.mtime_ns + MTIME_TOLERANCE_NS < remote_ns
+        cached = cache.get(key)
+        if (
+            cached
+            and cached.get("size") == lf.size
+            and cached.get("mtime_ns") == lf.mtime_ns
+            and (not suspect or cached.get("last_modified") == modified)
+        ):
+            expected = etags.get(key)
+            if expected and cached.get("md5") != expected:
+                results.append(FileResult(key, "corrupt", f"md5 {cached.get('md5')} != bucket ETag {expected}"))
+            else:
+                results.append(FileResult(key, "ok"))
+            continue
+        to_hash.append((key, lf, modified))
+
+    if to_hash:
+        print(f"Hashing {len(to_hash)} new or changed files ...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            digests = pool.map(lambda item: hash_file(item[1].path), to_hash)
+            for (key, lf, modified), digest in zip(to_hash, digests):
+                previous = cache.get(key)
+                expected = etags.get(key)
+                if expected:
+                    cache[key] = {"size": lf.size, "mtime_ns": lf.mtime_ns, "md5": digest, "last_modified": modified}
+                    if digest != expected:
+                        results.append(FileResult(key, "corrupt", f"md5 {digest} != bucket ETag {expected}"))
+                    else:
+                        results.append(FileResult(key, "ok"))
+                    continue
+                # No content hash from the bucket. Same bucket object but different bytes: keep the old hash as the
+                # reference so the file keeps failing until it is re-downloaded.
+                if previous and previous.get("last_modified") == modified and previous.get("md5") != digest:
+                    results.append(FileResult(key, "changed", f"md5 {previous.get('md5')} -> {digest}"))
+                    continue
+                cache[key] = {"size": lf.size, "mtime_ns": lf.mtime_ns, "md5": digest, "last_modified": modified}
+                results.append(FileResult(key, "ok"))
+
+    return results
+
+
+def group_results(results: list[FileResult]) -> dict[str, str]:
+    """Roll file results up to group/subgroup ids: pass, fail, or absent if nothing is local."""
+    present: dict[str, bool] = {}
+    failed: dict[str, bool] = {}
+    for r in results:
+        cls = classify(r.key, 1)
+        if cls is None:
+            continue
+        group_id, subgroup_id, _ = cls
+        for gid in (group_id, subgroup_id):
+            if gid is None:
+                continue
+            present.setdefault(gid, False)
+            failed.setdefault(gid, False)
+            if r.state != "missing":
+                present[gid] = True
+            if r.state != "ok":
+                failed[gid] = True
+    return {gid: ("fail" if failed[gid] else "pass") for gid in present if present[gid]}
+
+
+def update_status(csv_path: str, verdicts: dict[str, str]) -> None:
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        rows = [dict(r) for r in csv.DictReader(f)]
+    for row in rows:
+        if row["dataset_id"] in verdicts:
+            row["verified"] = verdicts[row["dataset_id"]]
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=STATUS_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Verify a local Bruker mirror against the bucket listing.")
+    p.add_argument("mirror", help="Root directory of the local mirror (bucket keys are relative to it)")
+    p.add_argument("files", nargs="?", default=FILES_DEFAULT, help="Bucket listing TSV")
+    p.add_argument("status", nargs="?", default=STATUS_DEFAULT, help="Status CSV to update")
+    p.add_argument("--cache", help=f"Hash cache (default: <mirror>/{CACHE_NAME})")
+    p.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) + 4))
+    args = p.parse_args()
+
+    cache_path = args.cache or os.path.join(args.mirror, CACHE_NAME)
+    entries = load_tsv(args.files)
+    print(f"Loaded {len(entries)} entries from {args.files}")
+
+    local = scan_mirror(args.mirror, args.workers)
+    local.pop(os.path.relpath(cache_path, args.mirror).replace(os.sep, "/"), None)
+    print(f"Found {len(local)} local files under {args.mirror}")
+
+    cache = load_cache(cache_path)
+    etags = load_etags(args.files)
+    if not etags:
+        print("Listing has no single-part ETags; only changes since the first hash can be detected")
+    results = verify(entries, local, cache, args.workers, etags)
+    save_cache(cache_path, cache)
+
+    for r in sorted(results, key=lambda r: r.key):
+        if r.state not in ("ok", "missing"):
+            print(f"  {r.state.upper():8} {r.key}  {r.detail}")
+    listed = {key for key, _, _ in entries}
+    extra = sorted(k for k in local if k not in listed)
+    if extra:
+        print(f"{len(extra)} local files are not in the bucket listing")
+
+    verdicts = group_results(results)
+    update_status(args.status, verdicts)
+    n_fail = sum(1 for v in verdicts.values() if v == "fail")
+    print(f"Verified {len(verdicts)} groups: {len(verdicts) - n_fail} pass, {n_fail} fail")
+    print(f"Wrote {args.status}")
+    return 1 if n_fail else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())